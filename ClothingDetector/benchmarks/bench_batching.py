@@ -0,0 +1,71 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "objectdetection"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets"))
+
+from detectorservice import load_detector_model
+from tally import DETECTOR_DIR, ClassTally
+from datasetcache import ShardDataset, compatible, shard_dir
+
+DATASET_DIR = os.path.join(DETECTOR_DIR, "datasets", "Clothing-Detection-10")
+
+# detect_clothing() decides after a fixed 5 second window
+WINDOW_SECONDS = 5
+
+
+def load_shard(width=640, height=360):
+    # Built with `datasetcache.py build --size 640x360 --mode stretch`, the same resize detect_clothing() does
+    path = shard_dir((width, height), "stretch")
+    return ShardDataset(path) if compatible(path, (width, height), "stretch") else None
+
+
+def load_frames(split="test", width=640, height=360):
+    shard = load_shard(width, height)
+    if shard is not None:
+        return shard.split_images(split)
+    paths = sorted(glob.glob(os.path.join(DATASET_DIR, split, "images", "*.jpg")))
+    return np.stack([cv2.resize(cv2.imread(path), (width, height)) for path in paths])
+
+
+def measure(model, frames, batch_size, repeats=3, confidence=0.80, overlap=30):
+    # Time inference + tallying over every frame, batch_size frames per infer() call
+    tally = ClassTally()
+    model.infer(list(frames[:batch_size]), confidence=confidence, overlap=overlap)  # warm-up
+    best = None
+    for _ in range(repeats):
+        tally.reset()
+        start = time.perf_counter()
+        for i in range(0, len(frames), batch_size):
+            results = model.infer(list(frames[i:i + batch_size]), confidence=confidence, overlap=overlap)
+            tally.add_results(results)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    fps = len(frames) / best
+    return {"batch_size": batch_size, "fps": fps, "frames_per_window": fps * WINDOW_SECONDS, "counts": tally.as_dict()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure frames per detection window for batched inference")
+    parser.add_argument("--backend", default=os.getenv("DETECTOR_BACKEND", "roboflow"))
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    model = load_detector_model(args.backend)
+    frames = load_frames(args.split)
+    print(f"{len(frames)} frames from {args.split}, backend {args.backend}")
+
+    baseline = None
+    for batch_size in [int(k) for k in args.batch_sizes.split(",")]:
+        result = measure(model, frames, batch_size, repeats=args.repeats)
+        baseline = baseline or result["fps"]
+        # Tallies must not depend on how frames were batched
+        print(f"batch={batch_size:<3} fps={result['fps']:7.1f}  frames/window={result['frames_per_window']:7.1f}  "
+              f"speedup={result['fps'] / baseline:4.2f}x  counts={result['counts']}")
@@ -0,0 +1,175 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "objectdetection"))
+
+from detectorservice import load_detector_model
+from gating import MotionGate
+from tally import load_class_names
+from decision import DEFAULT_TYPES
+from onnxbackend import OnnxPrediction, OnnxInferenceResult
+from bench_batching import DATASET_DIR, load_shard
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets"))
+
+from datasetcache import dhash, hamming
+
+
+def load_labelled_frames(split="test", width=640, height=360):
+    # Frames as detect_clothing() sees them, with the set of class ids labelled in each
+    shard = load_shard(width, height)
+    if shard is not None:
+        start, stop = shard.split_range(split)
+        return list(shard.split_images(split)), [{int(c) for c in shard.labels(row)[:, 0]} for row in range(start, stop)]
+    frames, labels = [], []
+    for path in sorted(glob.glob(os.path.join(DATASET_DIR, split, "images", "*.jpg"))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(os.path.join(DATASET_DIR, split, "labels", stem + ".txt")) as f:
+            labels.append({int(line.split()[0]) for line in f if line.strip()})
+        frames.append(cv2.resize(cv2.imread(path), (width, height)))
+    return frames, labels
+
+
+def replay(frames, labels, repeat, noise, seed=0):
+    # The mirror camera mostly sees a still scene: hold each image for `repeat` frames with sensor noise
+    rng = np.random.default_rng(seed)
+    for frame, label in zip(frames, labels):
+        for _ in range(repeat):
+            if noise > 0:
+                noisy = frame.astype(np.int16) + rng.normal(0, noise, frame.shape).astype(np.int16)
+                yield np.clip(noisy, 0, 255).astype(np.uint8), label
+            else:
+                yield frame, label
+
+
+class LabelOracle:
+    # Stands in for a trained model when there are no weights: recognises which dataset image a frame
+    # is by its dhash and answers with its labels after a fixed latency, so triggers time like real ones
+    def __init__(self, frames, labels, latency=0.05, confidence=0.9):
+        self.names = load_class_names()
+        self.hashes = np.array([dhash(frame) for frame in frames], dtype=np.uint64)
+        self.labels = labels
+        self.latency = latency
+        self.confidence = confidence
+
+    def infer_one(self, frame):
+        label = self.labels[int(np.argmin(hamming(self.hashes, np.uint64(dhash(frame)))))]
+        height, width = frame.shape[:2]
+        predictions = [OnnxPrediction(width / 2, height / 2, width, height, self.confidence, c, self.names[c])
+                       for c in sorted(label)]
+        return OnnxInferenceResult(predictions, width, height)
+
+    def infer(self, frames, confidence=0.80, overlap=30):
+        frames = frames if isinstance(frames, list) else [frames]
+        time.sleep(self.latency * len(frames))
+        return [self.infer_one(frame) for frame in frames]
+
+
+def run(model, frames, labels, gate, repeat, noise, confidence=0.80, overlap=30):
+    correct = total = 0
+    for frame, label in replay(frames, labels, repeat, noise):
+        if gate.should_infer(frame):
+            model_input, offset = gate.crop(frame)
+            gate.remember(model.infer(model_input, confidence=confidence, overlap=overlap)[0], offset)
+        predicted = {p.class_id for p in gate.last_result.predictions}
+        correct += predicted == label
+        total += 1
+    return {"frames": total, "accuracy": correct / total, **gate.stats()}
+
+
+def outfits(frames, labels, count):
+    # Every dataset image shows a top or a bottom, never both, so nothing in it can end a trigger early.
+    # Stack a top over a bottom to get scenes a decision can actually be made on.
+    names = load_class_names()
+    tops = [i for i, label in enumerate(labels) if label and all(DEFAULT_TYPES.get(names[c]) == "Top" for c in label)]
+    bottoms = [i for i, label in enumerate(labels) if label and all(DEFAULT_TYPES.get(names[c]) == "Bottom" for c in label)]
+    scenes, scene_labels = [], []
+    for top, bottom in zip(tops[:count], bottoms[:count]):
+        height, width = frames[top].shape[:2]
+        stacked = np.vstack([frames[top], frames[bottom]])
+        scenes.append(cv2.resize(stacked, (width, height)))
+        scene_labels.append(labels[top] | labels[bottom])
+    return scenes, scene_labels
+
+
+def run_triggers(model, scenes, threshold, count, fps, hold):
+    # Real detect_clothing() triggers against the replayed camera, timing how long each takes to decide
+    from mjpegserver import MjpegServer
+    from stubbackend import StubBackend
+
+    camera = MjpegServer([cv2.imencode(".jpg", scene)[1].tobytes() for scene in scenes], fps=fps, hold=hold).start()
+    backend = StubBackend().start()
+    os.environ["CAMERA_STREAM_IP"], os.environ["CAMERA_STREAM_PORT"] = camera.host, str(camera.port)
+    os.environ["BACKEND_SERVER_IP"], os.environ["BACKEND_SERVER_PORT"] = backend.host, str(backend.port)
+    os.environ.setdefault("DEFAULT_CLIENT_IP", "127_0_0_1")
+    os.environ["OUTBOX_PATH"] = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+    os.environ["MOTION_THRESHOLD"] = str(threshold)
+
+    import metrics
+    from objectdetect import detect_clothing
+    from detectorservice import DetectorService
+
+    service = DetectorService()
+    service.model = model
+    service.warm()
+    try:
+        latencies = []
+        for _ in range(count):
+            start = time.perf_counter()
+            detect_clothing(show_gui=False, service=service)
+            latencies.append(time.perf_counter() - start)
+        stats = service.gate().stats()
+    finally:
+        service.close()
+        camera.stop()
+        backend.stop()
+    return {"latency": metrics.percentiles(latencies), "inferred": stats["inferred"] / count,
+            "skipped": stats["skipped"] / count}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare inference count and accuracy with and without motion gating")
+    parser.add_argument("--backend", default=os.getenv("DETECTOR_BACKEND", "roboflow"))
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--repeat", type=int, default=5, help="Frames each still image is held for")
+    parser.add_argument("--noise", type=float, default=2.0, help="Gaussian sensor noise sigma")
+    parser.add_argument("--threshold", type=float, default=3.0)
+    parser.add_argument("--roi", action="store_true")
+    parser.add_argument("--oracle", action="store_true", help="Answer with the dataset labels instead of running a model")
+    parser.add_argument("--oracle-latency", type=float, default=0.05, help="Seconds the oracle takes per frame")
+    parser.add_argument("--triggers", type=int, default=0, help="Also time this many detect_clothing() triggers")
+    parser.add_argument("--fps", type=float, default=15, help="Replay frame rate of the fake camera for --triggers")
+    parser.add_argument("--hold", type=int, default=150, help="Frames each image is held for in --triggers")
+    args = parser.parse_args()
+    if args.oracle and args.roi:
+        # A crop no longer looks like the image it came from, so the oracle can't tell which one it is
+        parser.error("--oracle can't be combined with --roi")
+
+    frames, labels = load_labelled_frames(args.split)
+    scenes, scene_labels = outfits(frames, labels, args.triggers)
+    if args.oracle:
+        model = LabelOracle(frames + scenes, labels + scene_labels, latency=args.oracle_latency)
+    else:
+        model = load_detector_model(args.backend)
+
+    baseline = run(model, frames, labels, MotionGate(threshold=0), args.repeat, args.noise)
+    gated = run(model, frames, labels, MotionGate(threshold=args.threshold, roi=args.roi), args.repeat, args.noise)
+
+    # A frame counts as correct when its detected class set equals the labelled class set
+    print(f"ungated: {baseline['inferred']} inferences, accuracy {baseline['accuracy']:.3f}")
+    print(f"gated:   {gated['inferred']} inferences, accuracy {gated['accuracy']:.3f}, "
+          f"{gated['skipped']} skipped, {gated['roi_crops']} ROI crops")
+    print(f"saved {1 - gated['inferred'] / baseline['inferred']:.1%} of inferences")
+
+    if args.triggers:
+        # Gating must not make a still-scene trigger wait longer for its decision
+        for name, threshold in (("ungated", 0), ("gated", args.threshold)):
+            result = run_triggers(model, scenes, threshold, args.triggers, args.fps, args.hold)
+            print(f"{name} triggers: p50 {result['latency']['p50']:.2f}s  p95 {result['latency']['p95']:.2f}s, "
+                  f"{result['inferred']:.1f} inferred and {result['skipped']:.1f} skipped frames per trigger")
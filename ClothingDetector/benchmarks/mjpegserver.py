@@ -0,0 +1,91 @@
+import os
+import glob
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets", "Clothing-Detection-10")
+BOUNDARY = "123456789000000000000987654321"
+
+
+def load_jpegs(splits=("test", "valid")):
+    # The dataset images are already JPEGs, so they go out as-is like ESP32-CAM frames
+    paths = []
+    for split in splits:
+        paths += sorted(glob.glob(os.path.join(DATASET_DIR, split, "images", "*.jpg")))
+    jpegs = []
+    for path in paths:
+        with open(path, "rb") as f:
+            jpegs.append(f.read())
+    return jpegs
+
+
+class MjpegServer:
+    # Stand-in for the ESP32 camera: serves /stream as multipart MJPEG at a fixed frame rate
+    def __init__(self, jpegs, fps=15, hold=1, host="127.0.0.1", port=0):
+        self.jpegs = jpegs
+        self.fps = fps
+        self.hold = hold
+        self.frames_sent = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/stream":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace;boundary={BOUNDARY}")
+                self.end_headers()
+                server.stream(self.wfile)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address
+        self.thread = None
+
+    def stream(self, wfile):
+        interval = 1.0 / self.fps
+        next_frame = time.perf_counter()
+        i = 0
+        try:
+            while True:
+                # Each image is held for `hold` frames, like someone standing still in front of the mirror
+                jpeg = self.jpegs[(i // self.hold) % len(self.jpegs)]
+                wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode())
+                wfile.write(jpeg)
+                wfile.write(b"\r\n")
+                self.frames_sent += 1
+                i += 1
+                next_frame += interval
+                time.sleep(max(0.0, next_frame - time.perf_counter()))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def url(self):
+        return f"http://{self.host}:{self.port}/stream"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay the dataset images as an MJPEG camera stream")
+    parser.add_argument("--fps", type=float, default=15)
+    parser.add_argument("--hold", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--host", default="0.0.0.0")
+    args = parser.parse_args()
+    server = MjpegServer(load_jpegs(), fps=args.fps, hold=args.hold, host=args.host, port=args.port)
+    print(f"Streaming {len(server.jpegs)} images at {args.fps} fps on {server.url()}")
+    server.httpd.serve_forever()
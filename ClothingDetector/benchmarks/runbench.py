@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "objectdetection"))
+
+from mjpegserver import MjpegServer, load_jpegs
+from stubbackend import StubBackend
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+def frames_seen(service):
+    return sum(gate.frames for gate in service.gates.values())
+
+
+def run_triggers(trigger, service, count):
+    # Calls trigger() count times and reports latency percentiles and effective FPS
+    import metrics
+
+    latencies, items = [], []
+    frames_before = frames_seen(service)
+    for _ in range(count):
+        start = time.perf_counter()
+        items.append(trigger())
+        latencies.append(time.perf_counter() - start)
+    frames = frames_seen(service) - frames_before
+    return {
+        "triggers": count,
+        "latency": metrics.percentiles(latencies),
+        "mean_latency": sum(latencies) / count,
+        "effective_fps": frames / sum(latencies),
+        "frames": frames,
+        "detecteditems": items,
+    }
+
+
+def bench_direct(count):
+    from objectdetect import detect_clothing
+    from detectorservice import DetectorService
+
+    service = DetectorService()
+    service.warm()
+    try:
+        return run_triggers(lambda: detect_clothing(show_gui=False, service=service), service, count)
+    finally:
+        service.close()
+
+
+def bench_server(count):
+    import detectionserver
+
+    # Importing the server already started its warm-up, wait for that instead of loading twice
+    detectionserver.detector_service.start().join()
+    client = detectionserver.app.test_client()
+
+    def trigger():
+        response = client.post("/trigger-detection?wait=60")
+        return response.get_json().get("detecteditems")
+
+    try:
+        result = run_triggers(trigger, detectionserver.detector_service, count)
+        result["metrics_endpoint_bytes"] = len(client.get("/metrics").data)
+        return result
+    finally:
+        detectionserver.scheduler.shutdown()
+        detectionserver.detector_service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="End-to-end detector benchmark against a replayed camera and a stub backend")
+    parser.add_argument("--mode", choices=["direct", "server", "both"], default="both")
+    parser.add_argument("--triggers", type=int, default=10)
+    parser.add_argument("--fps", type=float, default=15, help="Replay frame rate of the fake camera")
+    parser.add_argument("--hold", type=int, default=15, help="Frames each image is held for")
+    parser.add_argument("--backend-latency", type=float, default=0.0)
+    parser.add_argument("--output", help="JSON file to write, defaults to benchmarks/results/<timestamp>.json")
+    args = parser.parse_args()
+
+    camera = MjpegServer(load_jpegs(), fps=args.fps, hold=args.hold).start()
+    backend = StubBackend(latency=args.backend_latency).start()
+
+    # Point the detector at the stand-ins before any of its modules read the environment
+    os.environ["CAMERA_STREAM_IP"], os.environ["CAMERA_STREAM_PORT"] = camera.host, str(camera.port)
+    os.environ["BACKEND_SERVER_IP"], os.environ["BACKEND_SERVER_PORT"] = backend.host, str(backend.port)
+    os.environ.setdefault("DEFAULT_CLIENT_IP", "127_0_0_1")
+    os.environ["OUTBOX_PATH"] = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+
+    import metrics
+
+    results = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "detector_backend": os.getenv("DETECTOR_BACKEND", "roboflow"),
+    }
+    for mode, bench in (("direct", bench_direct), ("server", bench_server)):
+        if args.mode in (mode, "both"):
+            metrics.reset_samples()
+            results[mode] = bench(args.triggers)
+            results[mode]["stages"] = metrics.summary()
+            print(f"{mode}: p50 {results[mode]['latency']['p50']:.2f}s  p95 {results[mode]['latency']['p95']:.2f}s  "
+                  f"p99 {results[mode]['latency']['p99']:.2f}s  {results[mode]['effective_fps']:.1f} fps")
+            for name, stage in results[mode]["stages"].items():
+                print(f"  {name:<10} n={stage['count']:<6} p50={stage['p50'] * 1000:8.2f}ms  p95={stage['p95'] * 1000:8.2f}ms")
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    results["camera_frames_sent"] = camera.frames_sent
+    results["backend_calls"] = backend.calls()
+    print(f"peak RSS {results['peak_rss_mb']:.0f} MB, backend calls {results['backend_calls']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+    camera.stop()
+    backend.stop()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "objectdetection"))
+
+from tally import load_class_names
+
+
+def create_app(latency=0.0):
+    # Just enough of the clothes backend for the detector: catalog, wear updates, outfit log, laundry list
+    app = Flask("stubbackend")
+    catalog = {
+        name: {"Name": name, "WearsBeforeWash": 0, "ConfiguredWears": 2,
+               "Type": "Bottom" if "Sweatpants" in name else "Top"}
+        for name in load_class_names()
+    }
+    app.config["calls"] = {"catalog": 0, "put": 0, "post": 0, "laundrylist": 0}
+    app.config["outfits"] = []
+
+    def slow():
+        if latency:
+            time.sleep(latency)
+
+    @app.route('/api/clothes/clothingcatalog', methods=['GET'])
+    def clothing_catalog():
+        slow()
+        app.config["calls"]["catalog"] += 1
+        return jsonify(list(catalog.values()))
+
+    @app.route('/api/clothes/laundrylist', methods=['GET'])
+    def laundry_list():
+        slow()
+        app.config["calls"]["laundrylist"] += 1
+        return jsonify([item for item in catalog.values() if item["WearsBeforeWash"] >= item["ConfiguredWears"]])
+
+    @app.route('/api/clothes/<name>', methods=['PUT'])
+    def update_clothing_item(name):
+        slow()
+        app.config["calls"]["put"] += 1
+        if name not in catalog:
+            return jsonify({"error": f"Unknown item {name}"}), 404
+        catalog[name]["WearsBeforeWash"] = request.json["wearsBeforeWash"]
+        return jsonify({"name": name, "wearsBeforeWash": catalog[name]["WearsBeforeWash"]})
+
+    @app.route('/api/clothes', methods=['POST'])
+    def add_clothes():
+        slow()
+        app.config["calls"]["post"] += 1
+        app.config["outfits"].append(request.json)
+        return jsonify({"message": "Clothes added successfully"}), 201
+
+    return app
+
+
+class StubBackend:
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0):
+        self.app = create_app(latency)
+        self.server = make_server(host, port, self.app, threaded=True)
+        self.host, self.port = host, self.server.server_port
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def calls(self):
+        return dict(self.app.config["calls"])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a stub clothes backend")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    args = parser.parse_args()
+    create_app(args.latency).run(host="0.0.0.0", port=args.port)
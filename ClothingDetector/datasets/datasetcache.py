@@ -0,0 +1,291 @@
+import os
+import re
+import glob
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Clothing-Detection-10")
+SPLITS = ("train", "valid", "test")
+SHARD_VERSION = 1
+
+# Roboflow exports name augmented copies <source>_<ext>.rf.<hash>.jpg, so copies share the part before .rf.
+RF_STEM = re.compile(r"^(?P<source>.+)\.rf\.[0-9a-f]+$")
+
+
+def shard_dir(size=(320, 320), mode="letterbox", dataset_dir=DATASET_DIR):
+    return os.path.join(dataset_dir, ".shards", f"{mode}-{size[0]}x{size[1]}")
+
+
+def content_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def source_stem(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = RF_STEM.match(stem)
+    return match.group("source") if match else stem
+
+
+def label_path(image_path):
+    images_dir, name = os.path.split(image_path)
+    return os.path.join(os.path.dirname(images_dir), "labels", os.path.splitext(name)[0] + ".txt")
+
+
+def read_labels(path):
+    # YOLO rows of class x y w h, normalised to the original image
+    if not os.path.exists(path):
+        return np.zeros((0, 5), dtype=np.float32)
+    with open(path) as f:
+        rows = [line.split()[:5] for line in f if line.strip()]
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def fit(image, size, mode, out):
+    # Writes image into out (size[1] x size[0]) and returns (scale_x, scale_y, pad_x, pad_y)
+    height, width = image.shape[:2]
+    if mode == "stretch":
+        out[:] = cv2.resize(image, size)
+        return size[0] / width, size[1] / height, 0, 0
+    scale = min(size[0] / width, size[1] / height)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    pad_x, pad_y = (size[0] - new_width) // 2, (size[1] - new_height) // 2
+    out[:] = 114
+    # Same interpolation as ultralytics and detect_clothing() so the shard matches what the model sees
+    out[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(image, (new_width, new_height))
+    return scale, scale, pad_x, pad_y
+
+
+def dhash(image):
+    # 64-bit difference hash, close hashes mean near-identical pictures
+    small = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _decode_into(job):
+    # Runs in a worker process: decode one JPEG and write it straight into its row of the shard
+    images_path, count, size, mode, row, path = job
+    images = np.memmap(images_path, dtype=np.uint8, mode="r+", shape=(count, size[1], size[0], 3))
+    image = cv2.imread(path)
+    geometry = fit(image, size, mode, images[row])
+    images.flush()
+    return row, geometry + (image.shape[1], image.shape[0]), dhash(image)
+
+
+class ShardDataset:
+    # Read side of a built shard. image() and labels() return views into the memory map, no copies.
+    def __init__(self, path, mode="r"):
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        index = np.load(os.path.join(path, "index.npz"))
+        self.paths = index["paths"]
+        self.hashes = index["hashes"]
+        self.splits = index["splits"]
+        self.groups = index["groups"]
+        self.dhashes = index["dhashes"]
+        self.geometry = index["geometry"]
+        self.label_offsets = index["label_offsets"]
+        self.label_rows = index["labels"]
+        width, height = self.meta["size"]
+        # mode="c" gives copy-on-write pages for augmentations that write into the image in place
+        self.images = np.memmap(os.path.join(path, "images.u8"), dtype=np.uint8, mode=mode,
+                                shape=(self.meta["count"], height, width, 3))
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def __getstate__(self):
+        # Dataloader workers re-open the map instead of receiving a pickled copy of every image
+        return {"path": self.path, "mode": self.mode}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["mode"])
+
+    def image(self, i):
+        return self.images[i]
+
+    def labels(self, i):
+        return self.label_rows[self.label_offsets[i]:self.label_offsets[i + 1]]
+
+    def split_indices(self, split):
+        return np.flatnonzero(self.splits == SPLITS.index(split))
+
+    def split_range(self, split):
+        # build_shard() writes the splits one after another, so each is a contiguous run of rows
+        indices = self.split_indices(split)
+        return (int(indices[0]), int(indices[-1]) + 1) if len(indices) else (0, 0)
+
+    def split_images(self, split):
+        # A view of every image in the split, sliced rather than fancy-indexed so nothing is copied
+        start, stop = self.split_range(split)
+        return self.images[start:stop]
+
+    def close(self):
+        # Windows won't replace a file that is still mapped
+        self.images._mmap.close()
+        self.images = None
+
+
+def compatible(path, size, mode):
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta.get("version") == SHARD_VERSION and meta.get("size") == list(size) and meta.get("mode") == mode
+
+
+def map_labels(labels, geometry, size):
+    # Move normalised boxes from the original image into the fitted one
+    scale_x, scale_y, pad_x, pad_y, width, height = geometry
+    mapped = labels.copy()
+    mapped[:, 1] = (labels[:, 1] * width * scale_x + pad_x) / size[0]
+    mapped[:, 2] = (labels[:, 2] * height * scale_y + pad_y) / size[1]
+    mapped[:, 3] = labels[:, 3] * width * scale_x / size[0]
+    mapped[:, 4] = labels[:, 4] * height * scale_y / size[1]
+    return mapped
+
+
+def build_shard(dataset_dir=DATASET_DIR, size=(320, 320), mode="letterbox", workers=None, out_dir=None):
+    out_dir = out_dir or shard_dir(size, mode, dataset_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    entries = [(split, path) for split in SPLITS
+               for path in sorted(glob.glob(os.path.join(dataset_dir, split, "images", "*.jpg")))]
+    count = len(entries)
+    hashes = [content_hash(path) for _, path in entries]
+
+    # Reuse rows whose JPEG hasn't changed since the last build
+    old = ShardDataset(out_dir) if compatible(out_dir, size, mode) else None
+    old_rows = {h: i for i, h in enumerate(old.hashes)} if old is not None else {}
+
+    images_path = os.path.join(out_dir, "images.u8.tmp")
+    images = np.memmap(images_path, dtype=np.uint8, mode="w+", shape=(count, size[1], size[0], 3))
+    geometry = np.zeros((count, 6), dtype=np.float32)
+    dhashes = np.zeros(count, dtype=np.uint64)
+    todo = []
+    for row, (_, path) in enumerate(entries):
+        old_row = old_rows.get(hashes[row])
+        if old_row is None:
+            todo.append((images_path, count, size, mode, row, path))
+        else:
+            images[row] = old.images[old_row]
+            geometry[row] = old.geometry[old_row]
+            dhashes[row] = old.dhashes[old_row]
+    images.flush()
+    del images
+    if old is not None:
+        old.close()
+
+    start = time.perf_counter()
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for row, row_geometry, row_dhash in pool.map(_decode_into, todo, chunksize=16):
+                geometry[row] = row_geometry
+                dhashes[row] = row_dhash
+    print(f"Decoded {len(todo)} of {count} images in {time.perf_counter() - start:.1f}s, reused {count - len(todo)}")
+
+    # Labels are cheap to parse, so they're always re-read in case only a .txt changed
+    label_offsets = np.zeros(count + 1, dtype=np.int64)
+    label_rows = []
+    for row, (_, path) in enumerate(entries):
+        labels = map_labels(read_labels(label_path(path)), geometry[row], size)
+        label_rows.append(labels)
+        label_offsets[row + 1] = label_offsets[row] + len(labels)
+
+    sources = [source_stem(path) for _, path in entries]
+    source_ids = {source: i for i, source in enumerate(dict.fromkeys(sources))}
+
+    os.replace(images_path, os.path.join(out_dir, "images.u8"))
+    np.savez(
+        os.path.join(out_dir, "index.npz"),
+        paths=np.array([path for _, path in entries]),
+        hashes=np.array(hashes),
+        splits=np.array([SPLITS.index(split) for split, _ in entries], dtype=np.int8),
+        groups=np.array([source_ids[source] for source in sources], dtype=np.int32),
+        dhashes=dhashes,
+        geometry=geometry,
+        label_offsets=label_offsets,
+        labels=np.concatenate(label_rows) if label_rows else np.zeros((0, 5), dtype=np.float32),
+    )
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"version": SHARD_VERSION, "size": list(size), "mode": mode, "count": count}, f)
+    return out_dir
+
+
+def hamming(a, b):
+    x = np.bitwise_xor(a, b)
+    return np.unpackbits(x.view(np.uint8).reshape(*x.shape, 8), axis=-1).sum(axis=-1)
+
+
+def find_duplicates(shard, max_distance=6):
+    # Augmentation groups (the *.rf.<hash> copies of one source) and near-identical images across groups
+    groups = {}
+    for i, group in enumerate(shard.groups):
+        groups.setdefault(int(group), []).append(i)
+    augmented = {g: rows for g, rows in groups.items() if len(rows) > 1}
+    leaks = {g: rows for g, rows in augmented.items() if len({int(shard.splits[r]) for r in rows}) > 1}
+
+    distances = hamming(shard.dhashes[:, None], shard.dhashes[None, :])
+    near = []
+    for i, j in zip(*np.nonzero(np.triu(distances <= max_distance, k=1))):
+        if shard.groups[i] != shard.groups[j]:
+            near.append((int(i), int(j), int(distances[i, j])))
+    return augmented, leaks, near
+
+
+def report_duplicates(shard, max_distance=6):
+    augmented, leaks, near = find_duplicates(shard, max_distance)
+    sizes = {}
+    for rows in augmented.values():
+        sizes[len(rows)] = sizes.get(len(rows), 0) + 1
+    print(f"{len(augmented)} augmentation groups by size: {dict(sorted(sizes.items()))}")
+    for rows in leaks.values():
+        print(f"Source in several splits: {[(SPLITS[shard.splits[r]], os.path.basename(shard.paths[r])) for r in rows]}")
+    for i, j, distance in near:
+        print(f"Near duplicate (distance {distance}): {os.path.basename(shard.paths[i])} {os.path.basename(shard.paths[j])}")
+
+
+def bench_epoch(shard, split="train"):
+    # One pass of image loading, the part of every epoch the shard replaces
+    indices = shard.split_indices(split)
+    size = tuple(shard.meta["size"])
+    out = np.empty((size[1], size[0], 3), dtype=np.uint8)
+
+    start = time.perf_counter()
+    for i in indices:
+        fit(cv2.imread(str(shard.paths[i])), size, shard.meta["mode"], out)
+    from_jpeg = time.perf_counter() - start
+
+    start = time.perf_counter()
+    checksum = 0
+    for i in indices:
+        checksum += int(shard.image(i)[::64, ::64].sum())
+    from_shard = time.perf_counter() - start
+    print(f"{len(indices)} {split} images: decode+fit {from_jpeg:.2f}s, shard {from_shard:.3f}s "
+          f"({from_jpeg / max(from_shard, 1e-9):.0f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build and inspect the pre-decoded dataset shard")
+    parser.add_argument("command", choices=["build", "duplicates", "bench"])
+    parser.add_argument("--size", default="320x320", help="WIDTHxHEIGHT, 320x320 matches imgsz in runs/detect")
+    parser.add_argument("--mode", choices=["letterbox", "stretch"], default="letterbox")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-distance", type=int, default=6)
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split("x"))
+
+    if args.command == "build":
+        print(f"Wrote {build_shard(size=size, mode=args.mode, workers=args.workers)}")
+    elif args.command == "duplicates":
+        report_duplicates(ShardDataset(shard_dir(size, args.mode)), args.max_distance)
+    else:
+        bench_epoch(ShardDataset(shard_dir(size, args.mode)))
@@ -0,0 +1,129 @@
+import os
+import time
+import argparse
+import cv2
+import yaml
+from ultralytics import YOLO
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+from ultralytics.utils.torch_utils import de_parallel
+from datasetcache import DATASET_DIR, ShardDataset, build_shard, shard_dir
+
+
+class ShardYOLODataset(YOLODataset):
+    # YOLODataset that takes images and labels from the shard instead of decoding JPEGs every epoch
+    def __init__(self, *args, shard=None, split="train", **kwargs):
+        self.shard = shard
+        self.rows = shard.split_indices(split)
+        super().__init__(*args, **kwargs)
+
+    def get_img_files(self, img_path):
+        return [str(self.shard.paths[row]) for row in self.rows]
+
+    def get_labels(self):
+        height, width = self.shard.images.shape[1:3]
+        labels = []
+        for row, im_file in zip(self.rows, self.im_files):
+            boxes = self.shard.labels(row)
+            labels.append({
+                "im_file": im_file,
+                "shape": (height, width),
+                "cls": boxes[:, :1].copy(),
+                "bboxes": boxes[:, 1:].copy(),
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            })
+        return labels
+
+    def load_image(self, i, rect_mode=True):
+        # A copy-on-write view: in-place augmentations touch private pages, never the shard file
+        image = self.shard.image(self.rows[i])
+        height, width = image.shape[:2]
+        if max(height, width) != self.imgsz:
+            scale = self.imgsz / max(height, width)
+            image = cv2.resize(image, (round(width * scale), round(height * scale)))
+        if self.augment:
+            # Mosaic picks its extra images from this buffer
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                self.buffer.pop(0)
+        return image, (height, width), image.shape[:2]
+
+
+class ShardDetectionTrainer(DetectionTrainer):
+    # Only saves the JPEG decode, so it pays off when the dataloader can't keep up with the model. On a
+    # 1 vCPU machine (ultralytics 8.3.40) an epoch took 332-351s against 340s decoding JPEGs.
+    def build_dataset(self, img_path, mode="train", batch=None):
+        stride = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        # mode="c" so augmentations that write into the image get private copy-on-write pages
+        shard = ShardDataset(shard_dir((self.args.imgsz, self.args.imgsz)), mode="c")
+        return ShardYOLODataset(
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=self.args,
+            rect=self.args.rect or mode == "val",
+            cache=None,
+            single_cls=self.args.single_cls or False,
+            stride=stride,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == "train" else 1.0,
+            shard=shard,
+            split="train" if mode == "train" else "valid",
+        )
+
+
+def shard_data_yaml(imgsz):
+    # data.yaml from Roboflow has paths relative to a folder that doesn't exist here, so write an absolute one
+    with open(os.path.join(DATASET_DIR, "data.yaml")) as f:
+        data = yaml.safe_load(f)
+    path = os.path.join(shard_dir((imgsz, imgsz)), "data.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump({
+            "path": DATASET_DIR,
+            "train": "train/images",
+            "val": "valid/images",
+            "test": "test/images",
+            "nc": data["nc"],
+            "names": data["names"],
+        }, f)
+    return path
+
+
+def log_epoch_time(trainer):
+    now = time.time()
+    started = getattr(trainer, "_epoch_started", trainer.train_time_start)
+    print(f"Epoch {trainer.epoch + 1} took {now - started:.1f}s")
+    trainer._epoch_started = now
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train YOLO from the pre-decoded dataset shard")
+    parser.add_argument("--model", default="yolo11s.pt")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    # Incremental, so this only decodes images that were added or changed since the last build
+    build_shard(size=(args.imgsz, args.imgsz))
+    model = YOLO(args.model)
+    model.add_callback("on_train_epoch_end", log_epoch_time)
+    model.train(
+        data=shard_data_yaml(args.imgsz),
+        trainer=ShardDetectionTrainer,
+        epochs=args.epochs,
+        imgsz=args.imgsz,
+        batch=args.batch,
+        workers=args.workers,
+        cache=False,
+    )
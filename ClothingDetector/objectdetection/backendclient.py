@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+OUTBOX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "outbox.sqlite3")
+
+
+def backend_url(path):
+    return f'http://{os.getenv("BACKEND_SERVER_IP")}:{os.getenv("BACKEND_SERVER_PORT")}{path}'
+
+
+def backend_headers():
+    client_ip = os.getenv("DEFAULT_CLIENT_IP")
+    return {"X-Forwarded-For": client_ip.replace("_", "."), "Content-Type": "application/json"}
+
+
+class BackendClient:
+    # One keep-alive session for every call to the clothes backend
+    def __init__(self, pool_size=4, timeout=5, retries=2):
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        self.session.headers.update(backend_headers())
+        # Only idempotent reads are retried here, writes go through the Outbox
+        retry = Retry(total=retries, backoff_factor=0.2, allowed_methods=["GET"], status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path, headers=None):
+        return self.session.get(backend_url(path), headers=headers, timeout=self.timeout)
+
+    def put(self, path, payload):
+        return self.session.put(backend_url(path), json=payload, timeout=self.timeout)
+
+    def post(self, path, payload):
+        return self.session.post(backend_url(path), json=payload, timeout=self.timeout)
+
+    def submit_detection(self, detection, progress=None):
+        # Deliver one detection result: a wear count update per item, then the day's outfit entry.
+        # Raises on any failure so the Outbox keeps the rest of the result for a retry.
+        # Counts are read from the backend now rather than when the detection was queued, so detections
+        # queued while it was down each add their own wear instead of all writing the same stale count.
+        pending = list(detection["pending_wears"])
+        if pending:
+            response = self.get("/api/clothes/clothingcatalog")
+            response.raise_for_status()
+            wears = {clothing["Name"]: clothing["WearsBeforeWash"] for clothing in response.json()}
+        while pending:
+            item = pending[0]
+            response = self.put(f"/api/clothes/{urllib.parse.quote(item)}", {"wearsBeforeWash": wears.get(item, 0) + 1})
+            response.raise_for_status()
+            # Record each landed update so a retry doesn't count the same wear twice
+            pending.pop(0)
+            detection["pending_wears"] = pending
+            if progress:
+                progress(detection)
+        # The backend has no idempotency key, a POST that timed out after landing is sent again on retry
+        response = self.post("/api/clothes", {"date": detection["date"], "items": detection["items"]})
+        response.raise_for_status()
+
+
+class ResponseCache:
+    # Caches a GET for ttl seconds, then revalidates it with If-None-Match
+    def __init__(self, client, path, ttl=60, default=None):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.data = default
+        self.etag = None
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+
+    def _fetch(self):
+        headers = {"If-None-Match": self.etag} if self.etag else None
+        try:
+            response = self.client.get(self.path, headers=headers)
+        except requests.exceptions.RequestException as e:
+            print(f"Error connecting to API: {e}")
+            return False
+        if response.status_code == 304:
+            self.fetched_at = time.time()
+        elif response.status_code == 200:
+            self.data = response.json()
+            self.etag = response.headers.get("ETag")
+            self.fetched_at = time.time()
+        else:
+            print(f"Failed to fetch data from {backend_url(self.path)}")
+            return False
+        return True
+
+    def get(self):
+        # Keeps serving the last good copy while the backend is unreachable
+        with self.lock:
+            if time.time() - self.fetched_at > self.ttl:
+                self._fetch()
+            return self.data
+
+    def invalidate(self):
+        with self.lock:
+            self.fetched_at = 0
+
+
+class Outbox:
+    # Durable queue of detection results in SQLite. A background thread delivers them and keeps
+    # retrying with exponential backoff while the backend is down, so detection never waits on it.
+    # Delivery is at-least-once: a write whose response was lost is sent again.
+    def __init__(self, client, path=OUTBOX_PATH, base_delay=1.0, max_delay=300.0, max_attempts=10, on_delivered=None):
+        self.client = client
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.on_delivered = on_delivered
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.delivered = 0
+        self.failures = 0
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL, created REAL NOT NULL, last_error TEXT)"
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(outbox)")}
+            if "dead" not in columns:
+                db.execute("ALTER TABLE outbox ADD COLUMN dead INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def enqueue(self, detection):
+        with self._connect() as db:
+            now = time.time()
+            db.execute("INSERT INTO outbox (payload, next_attempt, created) VALUES (?, ?, ?)",
+                       (json.dumps(detection), now, now))
+        self.wakeup.set()
+
+    def pending(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM outbox WHERE dead = 0").fetchone()[0]
+
+    def dead(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM outbox WHERE dead = 1").fetchone()[0]
+
+    def _lease(self, detection):
+        # Long enough for the catalog GET, every PUT and the POST to each use all their retries and time out
+        return (len(detection["pending_wears"]) + 2) * self.client.timeout * (self.client.retries + 1)
+
+    def _claim(self, db, row_id, now, lease):
+        # Several worker processes can share the file. Only the oldest row can be claimed, so one
+        # process at a time reads and bumps wear counts and their updates never overwrite each other.
+        claimed = db.execute("UPDATE outbox SET next_attempt = ? WHERE id = ? AND next_attempt <= ? "
+                             "AND id = (SELECT MIN(id) FROM outbox WHERE dead = 0)",
+                             (now + lease, row_id, now))
+        return claimed.rowcount == 1
+
+    def _save_progress(self, row_id, detection):
+        # Renews the claim too, so a slow delivery never runs past it into another process's retry
+        with self._connect() as db:
+            db.execute("UPDATE outbox SET payload = ?, next_attempt = ? WHERE id = ?",
+                       (json.dumps(detection), time.time() + self._lease(detection), row_id))
+
+    def flush(self):
+        # Sends due rows oldest first and stops at the first failure to keep them in order
+        now = time.time()
+        with self._connect() as db:
+            rows = db.execute("SELECT id, payload, attempts FROM outbox WHERE dead = 0 AND next_attempt <= ? "
+                              "ORDER BY id", (now,)).fetchall()
+        for row_id, payload, attempts in rows:
+            detection = json.loads(payload)
+            with self._connect() as db:
+                if not self._claim(db, row_id, now, self._lease(detection)):
+                    continue
+            try:
+                with metrics.stage("writeback"):
+                    self.client.submit_detection(detection,
+                                                 progress=lambda detection: self._save_progress(row_id, detection))
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and 400 <= e.response.status_code < 500 \
+                        and e.response.status_code not in (408, 429):
+                    # The backend rejected it, retrying won't help
+                    print(f"Dropping detection the backend rejected: {e}")
+                    with self._connect() as db:
+                        db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+                    self.failures += 1
+                    continue
+                if attempts + 1 >= self.max_attempts:
+                    # The backend keeps failing on this one, park it so newer detections still go out
+                    self._set_aside(row_id, attempts, e)
+                    continue
+                return self._retry_later(row_id, attempts, e)
+            except requests.exceptions.RequestException as e:
+                # Unreachable backend, not a bad row: keep retrying without an attempt limit
+                return self._retry_later(row_id, attempts, e)
+            with self._connect() as db:
+                db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+            self.delivered += 1
+            if self.on_delivered:
+                self.on_delivered()
+        return True
+
+    def _retry_later(self, row_id, attempts, e):
+        delay = min(self.max_delay, self.base_delay * 2 ** attempts) * random.uniform(0.8, 1.2)
+        with self._connect() as db:
+            db.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                       (attempts + 1, time.time() + delay, str(e), row_id))
+        self.failures += 1
+        print(f"Error updating API, retrying in {delay:.0f}s: {e}")
+        return False
+
+    def _set_aside(self, row_id, attempts, e):
+        # Kept with its last_error for a look by hand, UPDATE outbox SET dead = 0 sends it again
+        with self._connect() as db:
+            db.execute("UPDATE outbox SET attempts = ?, dead = 1, last_error = ? WHERE id = ?",
+                       (attempts + 1, str(e), row_id))
+        self.failures += 1
+        print(f"Giving up on detection {row_id} after {attempts + 1} attempts: {e}")
+
+    def next_due(self):
+        with self._connect() as db:
+            due = db.execute("SELECT MIN(next_attempt) FROM outbox WHERE dead = 0").fetchone()[0]
+        return None if due is None else max(0.0, due - time.time())
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.flush()
+            self.wakeup.clear()
+            due = self.next_due()
+            self.wakeup.wait(self.max_delay if due is None else due)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+
+    def stats(self):
+        return {"pending": self.pending(), "dead": self.dead(), "delivered": self.delivered, "failures": self.failures}
@@ -0,0 +1,122 @@
+import time
+import numpy as np
+
+# Catalog "Type" values that have to be decided before detection can stop early
+REQUIRED_TYPES = ("Top", "Bottom")
+
+# Types the backend seeds its catalog with (backend/src/models/clothesModel.js), used while the catalog is unreachable
+DEFAULT_TYPES = {
+    "Blue Hoodie": "Top", "Yellow Hoodie": "Top", "HOSA Hoodie": "Top", "Waterloo Hoodie": "Top",
+    "Yellow T-Shirt": "Top", "Maroon T-Shirt": "Top",
+    "White Sweatpants": "Bottom", "Blue Sweatpants": "Bottom", "Gray Sweatpants": "Bottom", "Navy Sweatpants": "Bottom",
+}
+
+
+class DecisionEngine:
+    # Keeps per-class evidence over a sliding window of frames and decides one item per catalog Type.
+    # Stops as soon as every required Type is decided, or at max_seconds with whatever is good enough.
+    def __init__(self, names, types, window=12, ema_alpha=0.3, min_frames=4, min_confidence=0.7,
+                 min_hit_ratio=0.6, margin=0.25, fallback_hit_ratio=0.3, max_seconds=5.0):
+        self.names = list(names)
+        self.window = window
+        self.ema_alpha = ema_alpha
+        self.min_frames = min_frames
+        self.min_confidence = min_confidence
+        self.min_hit_ratio = min_hit_ratio
+        self.margin = margin
+        self.fallback_hit_ratio = fallback_hit_ratio
+        self.max_seconds = max_seconds
+
+        # Classes with no known Type get a group each, so they're reported on their own and never block an early exit
+        types = {**DEFAULT_TYPES, **types}
+        self.groups = {}
+        for i, name in enumerate(self.names):
+            self.groups.setdefault(types.get(name, name), []).append(i)
+        self.groups = {group: np.array(ids) for group, ids in self.groups.items()}
+
+        self.hits = np.zeros((window, len(self.names)), dtype=bool)
+        self.ema = np.zeros(len(self.names), dtype=np.float64)
+        self.frames = 0
+        self.started = time.monotonic()
+        self.reason = None
+
+    def update_frame(self, predictions):
+        # Best confidence per class in this frame, 0 where the class wasn't seen
+        confidence = np.zeros(len(self.names), dtype=np.float64)
+        if predictions:
+            class_ids = np.fromiter((p.class_id for p in predictions), dtype=np.int64)
+            scores = np.fromiter((p.confidence for p in predictions), dtype=np.float64)
+            valid = (class_ids >= 0) & (class_ids < len(self.names))
+            np.maximum.at(confidence, class_ids[valid], scores[valid])
+
+        self.hits[self.frames % self.window] = confidence > 0
+        self.ema += self.ema_alpha * (confidence - self.ema)
+        self.frames += 1
+
+    def update(self, results):
+        for result in results:
+            self.update_frame(result.predictions)
+
+    def confidence(self):
+        # Bias-corrected EMA so a few strong frames aren't dragged down by the zero start
+        if self.frames == 0:
+            return self.ema
+        return self.ema / (1 - (1 - self.ema_alpha) ** self.frames)
+
+    def hit_ratio(self):
+        return self.hits.sum(axis=0) / max(1, min(self.frames, self.window))
+
+    def _group_best(self, confidence, ids):
+        order = ids[np.argsort(confidence[ids])[::-1]]
+        best = order[0]
+        runner_up = confidence[order[1]] if len(order) > 1 else 0.0
+        return best, runner_up
+
+    def decided_groups(self):
+        decided = {}
+        if self.frames < self.min_frames:
+            return decided
+        confidence = self.confidence()
+        hit_ratio = self.hit_ratio()
+        for group, ids in self.groups.items():
+            best, runner_up = self._group_best(confidence, ids)
+            if (confidence[best] >= self.min_confidence and hit_ratio[best] >= self.min_hit_ratio
+                    and confidence[best] - runner_up >= self.margin):
+                decided[group] = self.names[best]
+        return decided
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def done(self):
+        decided = self.decided_groups()
+        required = [group for group in REQUIRED_TYPES if group in self.groups]
+        if required and all(group in decided for group in required):
+            self.reason = "decided"
+            return True
+        if self.elapsed() >= self.max_seconds:
+            self.reason = "deadline"
+            return True
+        return False
+
+    def decision(self):
+        decided = self.decided_groups()
+        if self.reason == "deadline":
+            # Out of time: fall back to the best seen item of every group that showed up often enough
+            confidence = self.confidence()
+            hit_ratio = self.hit_ratio()
+            for group, ids in self.groups.items():
+                if group in decided:
+                    continue
+                best, _ = self._group_best(confidence, ids)
+                if hit_ratio[best] >= self.fallback_hit_ratio:
+                    decided[group] = self.names[best]
+        return list(decided.values())
+
+    def summary(self):
+        return {
+            "reason": self.reason,
+            "frames": self.frames,
+            "elapsed": round(self.elapsed(), 3),
+            "confidence": {self.names[i]: round(float(c), 3) for i, c in enumerate(self.confidence()) if c > 0},
+        }
@@ -1,34 +1,118 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import subprocess
 import os
-import requests
 from dotenv import load_dotenv
 from objectdetect import detect_clothing, get_client_ip
+from detectorservice import DetectorService, allowed_cameras, camera_stream_url
+from backendclient import ResponseCache
+from jobs import JobScheduler, detect_in_worker
+import metrics
 
 load_dotenv()
 
 app = Flask(__name__)
 
+# Model, camera connection and catalog stay warm for the lifetime of the server
+detector_service = DetectorService()
+
+# Detection runs on DETECTION_WORKERS workers, threads sharing detector_service by default or
+# separate processes (each with its own warm service) when DETECTION_PROCESSES=true
+DETECTION_PROCESSES = os.getenv("DETECTION_PROCESSES", "false").lower() == "true"
+if DETECTION_PROCESSES:
+    scheduler = JobScheduler(detect_in_worker, workers=int(os.getenv("DETECTION_WORKERS", "1")), processes=True)
+else:
+    scheduler = JobScheduler(
+        lambda camera: detect_clothing(show_gui=False, service=detector_service, camera_url=camera),
+        workers=int(os.getenv("DETECTION_WORKERS", "1")),
+    )
+
+laundry_list_cache = ResponseCache(
+    detector_service.backend_client, "/api/clothes/laundrylist", ttl=float(os.getenv("LAUNDRY_LIST_TTL", "10"))
+)
+
+def service_status():
+    if DETECTION_PROCESSES:
+        return scheduler.worker_status()
+    return detector_service.status()
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    # The ESP32 polls this and only fires triggers once the service is warm
+    status = service_status()
+    return jsonify(status), (200 if status["ready"] else 503)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Per-stage timings and frame counters in the Prometheus text format
+    body, content_type = metrics.exposition()
+    return Response(body, content_type=content_type)
+
+def job_response(job):
+    if job.status == "done":
+        return jsonify({**job.to_dict(), "status": "success"}), 200
+    if job.status == "failed":
+        return jsonify({**job.to_dict(), "status": "error"}), 500
+    return jsonify(job.to_dict()), 202
+
 @app.route('/trigger-detection', methods=['POST'])
 def trigger_detection():
     # Run without GUI when triggered via HTTP
-    detecteditems = detect_clothing(show_gui=False)
-    return jsonify({"status": "success", "detecteditems": detecteditems})
+    if not service_status()["ready"]:
+        return jsonify({"status": "error", "message": "Detector is still warming up"}), 503
+    body = request.get_json(silent=True) or {}
+    camera = body.get("camera") or camera_stream_url()
+    # Every camera gets a stream and a decoding thread, so only configured ones can be asked for
+    if camera not in allowed_cameras():
+        return jsonify({"status": "error", "message": "Unknown camera"}), 400
+    # Triggers for a camera that is already being scanned share the running job
+    job, coalesced = scheduler.submit(camera)
+
+    # ?wait=<seconds> holds the request until the job finishes, for callers that want the items inline
+    wait = request.args.get("wait", type=float)
+    if wait:
+        job.done.wait(wait)
+    return job_response(job)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    # Long poll: answers as soon as the job finishes or after ?timeout= seconds
+    job = scheduler.wait(job_id, request.args.get("timeout", default=30, type=float))
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+    return job_response(job)
 
 @app.route('/laundry-list', methods=['GET'])
 def laundry_list():
-    # Use IP address instead of device ID
-    client_ip = os.getenv("DEFAULT_CLIENT_IP")
-    headers = {
-        'X-Forwarded-For': client_ip.replace("_", "."),
-        'Content-Type': 'application/json',
-    }
-    try:
-        response = requests.get(f'http://{os.getenv("BACKEND_SERVER_IP")}:{os.getenv("BACKEND_SERVER_PORT")}/api/clothes/laundrylist', headers=headers)
-        return response.json()
-    except requests.exceptions.RequestException:
+    # Served from a short-lived cache that revalidates with the backend's ETag
+    data = laundry_list_cache.get()
+    if data is None:
         return jsonify({"status": "error", "message": "Failed to fetch laundry list"})
+    return jsonify(data)
+
+def start_warmup():
+    if DETECTION_PROCESSES:
+        scheduler.warm()
+    else:
+        detector_service.start()
+
+# FLASK_RELOAD=false runs the debug server without the reloader
+USE_RELOADER = os.getenv("FLASK_RELOAD", "true").lower() == "true"
+
+# Imported by a WSGI server: warm up right away. Worker processes spawned by DETECTION_PROCESSES
+# re-import the main module as __mp_main__ and warm their own service instead.
+if __name__ not in ('__main__', '__mp_main__'):
+    start_warmup()
 
 if __name__ == '__main__':
+    # The reloader's parent process only watches files, warm up in the process that serves requests
+    if not USE_RELOADER or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warmup()
     # Run on all network interfaces so ESP32 can connect
-    app.run(host='0.0.0.0', port=os.getenv("PYTHON_SERVER_PORT"), debug=True)
+    app.run(host='0.0.0.0', port=os.getenv("PYTHON_SERVER_PORT"), debug=True, use_reloader=USE_RELOADER)
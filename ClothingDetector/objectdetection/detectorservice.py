@@ -0,0 +1,245 @@
+import os
+import time
+import threading
+import cv2
+from backendclient import OUTBOX_PATH, BackendClient, Outbox, ResponseCache
+from framegrabber import FrameGrabber
+from gating import MotionGate
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROJECT_ID = "niceworkspace/clothing-detection-uhmgf"
+DATASET_VERSION = "10"
+
+# "roboflow" pulls the hosted model with ROBOFLOW_API_KEY, "onnx" serves a local runs/detect export on CPU
+BACKENDS = ("roboflow", "onnx")
+
+
+def load_roboflow_model():
+    import inference
+
+    model_id = PROJECT_ID.split("/")[1] + "/" + DATASET_VERSION
+    return inference.get_model(model_id, os.getenv("ROBOFLOW_API_KEY"))
+
+
+def load_detector_model(backend=None):
+    backend = backend or os.getenv("DETECTOR_BACKEND", "roboflow")
+    if backend == "roboflow":
+        return load_roboflow_model()
+    if backend == "onnx":
+        # Imported here so the Roboflow-only setup doesn't need onnxruntime installed
+        from onnxbackend import load_onnx_model
+        return load_onnx_model()
+    raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS}")
+
+
+def camera_stream_url():
+    return f'http://{os.getenv("CAMERA_STREAM_IP")}:{os.getenv("CAMERA_STREAM_PORT")}/stream'
+
+
+def allowed_cameras():
+    # Streams a trigger may ask for: the default camera plus the comma-separated DETECTION_CAMERAS
+    extra = [url.strip() for url in os.getenv("DETECTION_CAMERAS", "").split(",") if url.strip()]
+    return [camera_stream_url(), *extra]
+
+
+class CameraStream:
+    # Keeps one VideoCapture open across triggers and reopens it when the ESP32 drops the stream
+    def __init__(self, url, reconnect_attempts=3, reconnect_delay=1.0):
+        self.url = url
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.capture = None
+        self.down = False
+        self.lock = threading.Lock()
+
+    def _open(self):
+        if self.capture is not None:
+            self.capture.release()
+        self.capture = cv2.VideoCapture(self.url)
+        # Don't let OpenCV queue up frames between triggers
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return self.capture.isOpened()
+
+    def is_opened(self):
+        return self.capture is not None and self.capture.isOpened()
+
+    def connect(self):
+        with self.lock:
+            if self.is_opened():
+                return True
+            for attempt in range(self.reconnect_attempts):
+                if self._open():
+                    return True
+                print(f"Error: Could not connect to camera stream (attempt {attempt + 1})")
+                time.sleep(self.reconnect_delay)
+            return False
+
+    def read(self):
+        for attempt in range(self.reconnect_attempts):
+            # Not held while sleeping, so a trigger's connect() doesn't wait out the retries
+            with self.lock:
+                if self.is_opened():
+                    ret, frame = self.capture.read()
+                    if ret and frame is not None:
+                        if self.down:
+                            print("Camera stream is back")
+                            self.down = False
+                        return True, frame
+                # Only say so once, the stream is off between every scan
+                if not self.down:
+                    print("Camera stream dropped, reconnecting")
+                    self.down = True
+                opened = self._open()
+            if not opened:
+                time.sleep(self.reconnect_delay)
+        return False, None
+
+    def release(self):
+        with self.lock:
+            if self.capture is not None:
+                self.capture.release()
+                self.capture = None
+
+
+class CatalogCache(ResponseCache):
+    # The clothing catalog, refreshed with its ETag once the TTL runs out
+    def __init__(self, client, ttl=60):
+        super().__init__(client, "/api/clothes/clothingcatalog", ttl=ttl, default=[])
+
+    def types(self):
+        types = {}
+        try:
+            for clothing in self.get():
+                types[clothing["Name"]] = clothing["Type"]
+        except (TypeError, KeyError) as e:
+            print(f"Error processing API data: {e}")
+        return types
+
+
+class DetectorService:
+    # Holds everything detect_clothing() needs so a trigger doesn't pay for it again
+    def __init__(self, catalog_ttl=None, backend=None):
+        if catalog_ttl is None:
+            catalog_ttl = float(os.getenv("CATALOG_TTL", "60"))
+        self.backend = backend or os.getenv("DETECTOR_BACKEND", "roboflow")
+        self.model = None
+        self.backend_client = BackendClient()
+        self.catalog = CatalogCache(self.backend_client, ttl=catalog_ttl)
+        # Our wear count updates make the cached catalog stale once they land
+        self.outbox = Outbox(self.backend_client, path=os.getenv("OUTBOX_PATH", OUTBOX_PATH),
+                             on_delivered=self.catalog.invalidate)
+        self.cameras = {}
+        self.grabbers = {}
+        self.gates = {}
+        self.cameras_lock = threading.Lock()
+        # Grabbers nobody has read from for this long are stopped, the next trigger starts them again
+        self.grabber_idle_seconds = float(os.getenv("GRABBER_IDLE_SECONDS", "60"))
+        self.reaper = None
+        self.stop_event = threading.Event()
+        self.ready = threading.Event()
+        self.error = None
+        self.warm_thread = None
+
+    def load_model(self):
+        return load_detector_model(self.backend)
+
+    def camera(self, url=None):
+        url = url or camera_stream_url()
+        with self.cameras_lock:
+            if url not in self.cameras:
+                self.cameras[url] = CameraStream(url)
+            return self.cameras[url]
+
+    def grabber(self, url=None):
+        url = url or camera_stream_url()
+        camera = self.camera(url)
+        with self.cameras_lock:
+            if url not in self.grabbers:
+                self.grabbers[url] = FrameGrabber(camera)
+            grabber = self.grabbers[url]
+            grabber.last_used = time.time()
+        grabber.start()
+        if self.reaper is None or not self.reaper.is_alive():
+            self.reaper = threading.Thread(target=self._reap_idle, daemon=True)
+            self.reaper.start()
+        return grabber
+
+    def stop_idle(self):
+        # Includes the default camera: the ESP32 turns it off after every scan anyway
+        with self.cameras_lock:
+            idle = [url for url, grabber in self.grabbers.items() if grabber.idle_seconds() > self.grabber_idle_seconds]
+            for url in idle:
+                self.grabbers.pop(url).stop()
+                self.cameras.pop(url).release()
+        for url in idle:
+            print(f"Stopped idle camera stream {url}")
+        return idle
+
+    def _reap_idle(self):
+        while not self.stop_event.wait(self.grabber_idle_seconds / 2):
+            self.stop_idle()
+
+    def gate(self, url=None):
+        # One gate per camera so its counters add up across triggers; MOTION_THRESHOLD=0 disables skipping
+        url = url or camera_stream_url()
+        with self.cameras_lock:
+            if url not in self.gates:
+                self.gates[url] = MotionGate(
+                    threshold=float(os.getenv("MOTION_THRESHOLD", "3")),
+                    roi=os.getenv("ROI_CROP", "false").lower() == "true",
+                )
+            return self.gates[url]
+
+    def warm(self, connect_camera=True, retry_delay=1.0, max_retry_delay=60.0):
+        # Keeps retrying with backoff, a model download or backend hiccup at boot shouldn't need a restart
+        delay = retry_delay
+        while True:
+            try:
+                if self.model is None:
+                    self.model = self.load_model()
+                self.outbox.start()
+                self.catalog.get()
+                if connect_camera and self.camera().connect():
+                    self.grabber()
+                self.error = None
+                self.ready.set()
+                print("Detector service is ready")
+                return
+            except Exception as e:
+                self.error = str(e)
+                print(f"Error warming detector service, retrying in {delay:.0f}s: {e}")
+            time.sleep(delay)
+            delay = min(max_retry_delay, delay * 2)
+
+    def start(self):
+        # Warm up in the background so the server can answer /ready while the model loads
+        if self.warm_thread is None or not self.warm_thread.is_alive():
+            self.warm_thread = threading.Thread(target=self.warm, daemon=True)
+            self.warm_thread.start()
+        return self.warm_thread
+
+    def status(self):
+        return {
+            "ready": self.ready.is_set(),
+            "backend": self.backend,
+            "model_loaded": self.model is not None,
+            "cameras": {url: camera.is_opened() for url, camera in self.cameras.items()},
+            "catalog_items": len(self.catalog.data),
+            "frames": {url: grabber.stats() for url, grabber in self.grabbers.items()},
+            "gating": {url: gate.stats() for url, gate in self.gates.items()},
+            "outbox": self.outbox.stats(),
+            "error": self.error,
+        }
+
+    def close(self):
+        self.stop_event.set()
+        self.outbox.stop()
+        with self.cameras_lock:
+            for grabber in self.grabbers.values():
+                grabber.stop()
+            self.grabbers = {}
+            for camera in self.cameras.values():
+                camera.release()
+            self.cameras = {}
@@ -0,0 +1,144 @@
+import time
+import threading
+from collections import deque
+import cv2
+import numpy as np
+import metrics
+
+
+class FrameGrabber:
+    # Reads and resizes camera frames on its own thread so inference always sees the newest frame.
+    # Frames live in buffer_size + 2 preallocated buffers shared between the ring, the one being written
+    # by the grabber and the one leased to the (single) consumer until it asks for the next frame.
+    def __init__(self, camera, width=640, height=360, buffer_size=2, max_backoff=30.0):
+        self.camera = camera
+        self.width = width
+        self.height = height
+        self.buffers = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(buffer_size + 2)]
+        self.free = list(range(len(self.buffers)))
+        self.ring = deque()  # (seq, buffer index, timestamp), oldest first
+        self.leased = None
+        self.seq = 0
+        self.decoded = 0
+        self.dropped = 0
+        self.consumed = 0
+        self.read_errors = 0
+        self.last_used = time.time()
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        # Cuts a reconnect backoff short when a trigger wants frames again
+        self.wakeup = threading.Event()
+        self.max_backoff = max_backoff
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.wakeup.set()
+            return
+        self.stop_event.clear()
+        self.last_used = time.time()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def idle_seconds(self):
+        return time.time() - self.last_used
+
+    def _take_buffer(self):
+        # Prefer a free buffer, otherwise overwrite the oldest frame nobody has looked at
+        if self.free:
+            return self.free.pop()
+        _, index, _ = self.ring.popleft()
+        self.dropped += 1
+        metrics.count_frames("dropped")
+        return index
+
+    def _run(self):
+        failures = 0
+        while not self.stop_event.is_set():
+            # Blocks until the next MJPEG frame arrives, so this is mostly the camera's frame interval.
+            # OpenCV's FFmpeg backend decodes inside the same call, there's no separate decode to time.
+            with metrics.stage("camera_read"):
+                ret, frame = self.camera.read()
+            if not ret or frame is None:
+                self.read_errors += 1
+                with self.condition:
+                    # Frames from before the drop would look current to the next trigger, throw them away
+                    self._drop_ring()
+                # The ESP32 turns its camera off between scans, so back off rather than reconnect every second
+                failures += 1
+                self.wakeup.wait(min(self.max_backoff, self.camera.reconnect_delay * 2 ** min(failures - 1, 10)))
+                self.wakeup.clear()
+                continue
+            failures = 0
+
+            with self.condition:
+                index = self._take_buffer()
+            # The buffer is in neither the ring nor the free list, so it's safe to write unlocked
+            with metrics.stage("resize"):
+                cv2.resize(frame, (self.width, self.height), dst=self.buffers[index])
+
+            with self.condition:
+                self.seq += 1
+                self.decoded += 1
+                metrics.count_frames("decoded")
+                self.ring.append((self.seq, index, time.time()))
+                self.condition.notify_all()
+
+    def _drop_ring(self):
+        while self.ring:
+            _, stale, _ = self.ring.popleft()
+            self.free.append(stale)
+            self.dropped += 1
+            metrics.count_frames("dropped")
+
+    def current_seq(self):
+        # Pass this as after_seq to only get frames decoded from now on
+        with self.condition:
+            return self.seq
+
+    def latest(self, after_seq=0, timeout=5.0):
+        # Returns (seq, frame) for the newest frame newer than after_seq, or (None, None) on timeout.
+        # The frame stays valid until the next call to latest() or release().
+        deadline = time.time() + timeout
+        self.last_used = time.time()
+        with self.condition:
+            while not self.ring or self.ring[-1][0] <= after_seq:
+                remaining = deadline - time.time()
+                if remaining <= 0 or self.stop_event.is_set():
+                    return None, None
+                self.condition.wait(remaining)
+
+            seq, index, _ = self.ring.pop()
+            # Everything older than the newest frame is stale, hand those buffers back
+            self._drop_ring()
+            if self.leased is not None:
+                self.free.append(self.leased)
+            self.leased = index
+            self.consumed += 1
+            return seq, self.buffers[index]
+
+    def release(self):
+        with self.condition:
+            if self.leased is not None:
+                self.free.append(self.leased)
+                self.leased = None
+
+    def stats(self):
+        with self.condition:
+            return {
+                "decoded": self.decoded,
+                "dropped": self.dropped,
+                "consumed": self.consumed,
+                "read_errors": self.read_errors,
+                "buffered": len(self.ring),
+            }
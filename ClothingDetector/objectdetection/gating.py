@@ -0,0 +1,96 @@
+import numpy as np
+import cv2
+
+
+class MotionGate:
+    # Skips inference on frames that barely differ from the last inferred one and reuses its detections.
+    # The score is the mean absolute difference of small grayscale thumbnails (0-255 scale).
+    def __init__(self, threshold=3.0, thumb_size=(64, 36), max_skips=8, roi=False, roi_padding=0.2, roi_refresh=6):
+        self.threshold = threshold
+        self.thumb_size = thumb_size
+        self.max_skips = max_skips
+        self.roi = roi
+        self.roi_padding = roi_padding
+        self.roi_refresh = roi_refresh
+        self.gray = None
+        self.thumb = np.empty((thumb_size[1], thumb_size[0]), dtype=np.uint8)
+        self.reference = np.empty_like(self.thumb)
+        self.diff = np.empty_like(self.thumb)
+        self.frames = 0
+        self.inferred = 0
+        self.skipped = 0
+        self.roi_crops = 0
+        self.reset()
+
+    def reset(self):
+        # Forget the reference frame and detections, counters keep running across triggers
+        self.has_reference = False
+        self.last_result = None
+        self.consecutive_skips = 0
+        self.since_full_frame = 0
+        self.last_score = None
+
+    def score(self, frame):
+        if self.gray is None or self.gray.shape != frame.shape[:2]:
+            self.gray = np.empty(frame.shape[:2], dtype=np.uint8)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        cv2.resize(self.gray, self.thumb_size, dst=self.thumb, interpolation=cv2.INTER_AREA)
+        if not self.has_reference:
+            return None
+        cv2.absdiff(self.thumb, self.reference, dst=self.diff)
+        return float(self.diff.mean())
+
+    def should_infer(self, frame, force=False):
+        # force still moves the reference frame on, so gating picks up from this frame afterwards
+        self.frames += 1
+        score = self.score(frame)
+        self.last_score = score
+        if (force or score is None or score >= self.threshold or self.last_result is None
+                or self.consecutive_skips >= self.max_skips):
+            np.copyto(self.reference, self.thumb)
+            self.has_reference = True
+            self.consecutive_skips = 0
+            self.inferred += 1
+            return True
+        self.consecutive_skips += 1
+        self.skipped += 1
+        return False
+
+    def crop(self, frame):
+        # Returns (input, (x_offset, y_offset)); crops to the padded union of the last detections
+        if not self.roi or self.last_result is None or not self.last_result.predictions \
+                or self.since_full_frame >= self.roi_refresh:
+            self.since_full_frame = 0
+            return frame, (0, 0)
+        predictions = self.last_result.predictions
+        x1 = min(p.x - p.width / 2 for p in predictions)
+        y1 = min(p.y - p.height / 2 for p in predictions)
+        x2 = max(p.x + p.width / 2 for p in predictions)
+        y2 = max(p.y + p.height / 2 for p in predictions)
+        pad_x, pad_y = (x2 - x1) * self.roi_padding, (y2 - y1) * self.roi_padding
+        height, width = frame.shape[:2]
+        x1, y1 = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+        x2, y2 = min(width, int(x2 + pad_x)), min(height, int(y2 + pad_y))
+        if x2 - x1 < 32 or y2 - y1 < 32:
+            self.since_full_frame = 0
+            return frame, (0, 0)
+        self.since_full_frame += 1
+        self.roi_crops += 1
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def remember(self, result, offset=(0, 0)):
+        # Move cropped detections back into full-frame coordinates before reusing them
+        if offset != (0, 0):
+            for prediction in result.predictions:
+                prediction.x += offset[0]
+                prediction.y += offset[1]
+        self.last_result = result
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "inferred": self.inferred,
+            "skipped": self.skipped,
+            "roi_crops": self.roi_crops,
+            "last_score": self.last_score,
+        }
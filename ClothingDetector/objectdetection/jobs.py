@@ -0,0 +1,159 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Each worker process keeps its own warm DetectorService
+_worker_service = None
+
+
+def warm_worker():
+    global _worker_service
+    if _worker_service is None:
+        from detectorservice import DetectorService
+        _worker_service = DetectorService()
+        # Cameras are opened by the first job for them, so two workers never hold the same stream
+        _worker_service.warm(connect_camera=False)
+    return _worker_service.status()
+
+
+def detect_in_worker(camera_url):
+    from objectdetect import detect_clothing
+    warm_worker()
+    return detect_clothing(show_gui=False, service=_worker_service, camera_url=camera_url)
+
+
+class Job:
+    def __init__(self, camera):
+        self.id = uuid.uuid4().hex
+        self.camera = camera
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.coalesced = 0
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        status = self.status
+        if status == "queued" and self.future is not None and self.future.running():
+            status = "running"
+        return {
+            "job_id": self.id,
+            "camera": self.camera,
+            "status": status,
+            "detecteditems": self.result,
+            "error": self.error,
+            "coalesced": self.coalesced,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class JobScheduler:
+    # Runs detection jobs off the request thread. Triggers for a camera that already has a job in
+    # flight join that job instead of starting a second capture. Every camera sticks to one
+    # single-worker shard, so its jobs never overlap and only one process ever opens its stream.
+    def __init__(self, target, workers=1, processes=False, keep=200):
+        self.target = target
+        self.processes = processes
+        self.keep = keep
+        self.shards = [self._new_shard(i) for i in range(workers)]
+        self.camera_shards = {}
+        self.jobs = OrderedDict()
+        self.inflight = {}
+        self.warmups = []
+        self.lock = threading.Lock()
+
+    def _new_shard(self, i):
+        if self.processes:
+            return ProcessPoolExecutor(max_workers=1)
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"detect-{i}")
+
+    def _shard_index(self, camera):
+        if camera not in self.camera_shards:
+            self.camera_shards[camera] = len(self.camera_shards) % len(self.shards)
+        return self.camera_shards[camera]
+
+    def _submit(self, camera):
+        i = self._shard_index(camera)
+        try:
+            return self.shards[i].submit(self.target, camera)
+        except BrokenProcessPool:
+            # The worker process died (e.g. killed or crashed), replace it with a fresh one and warm it
+            print(f"Detection worker {i} died, starting a new one")
+            self.shards[i] = self._new_shard(i)
+            if self.processes and i < len(self.warmups):
+                self.warmups[i] = self.shards[i].submit(warm_worker)
+            return self.shards[i].submit(self.target, camera)
+
+    def submit(self, camera):
+        # Returns (job, coalesced)
+        with self.lock:
+            job = self.inflight.get(camera)
+            if job is not None:
+                job.coalesced += 1
+                return job, True
+
+            job = Job(camera)
+            # Only registered once it's really queued, a failed submit must not leave the camera in flight
+            job.future = self._submit(camera)
+            self.jobs[job.id] = job
+            self.inflight[camera] = job
+            while len(self.jobs) > self.keep:
+                oldest = next(iter(self.jobs.values()))
+                if not oldest.done.is_set():
+                    break
+                self.jobs.popitem(last=False)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job, False
+
+    def _finish(self, job, future):
+        with self.lock:
+            try:
+                job.result = future.result()
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                print(f"Detection job {job.id} failed: {e}")
+            job.finished = time.time()
+            if self.inflight.get(job.camera) is job:
+                del self.inflight[job.camera]
+        job.done.set()
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def wait(self, job_id, timeout):
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def warm(self):
+        # Load the model in every worker process up front
+        if self.processes:
+            self.warmups = [shard.submit(warm_worker) for shard in self.shards]
+
+    def worker_status(self):
+        workers = []
+        for warmup in self.warmups:
+            if warmup.done() and warmup.exception() is None:
+                workers.append(warmup.result())
+            else:
+                workers.append({"ready": False, "error": str(warmup.exception()) if warmup.done() else None})
+        return {
+            "ready": bool(workers) and all(worker["ready"] for worker in workers),
+            "workers": workers,
+            "inflight": len(self.inflight),
+        }
+
+    def shutdown(self):
+        for shard in self.shards:
+            shard.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,62 @@
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import numpy as np
+from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+TRIGGER_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 4.0, 5.0, 7.5, 10.0, 20.0)
+
+STAGE_SECONDS = Histogram("detector_stage_seconds", "Time spent per pipeline stage", ["stage"], buckets=STAGE_BUCKETS)
+TRIGGER_SECONDS = Histogram("detector_trigger_seconds", "Time from trigger to decision", buckets=TRIGGER_BUCKETS)
+FRAME_EVENTS = Counter("detector_frames_total", "Frames by what happened to them", ["event"])
+
+# Recent raw samples per stage, for percentiles in the benchmark runner
+samples = defaultdict(lambda: deque(maxlen=10000))
+
+
+def observe(name, seconds):
+    if name == "trigger":
+        TRIGGER_SECONDS.observe(seconds)
+    else:
+        STAGE_SECONDS.labels(name).observe(seconds)
+    samples[name].append(seconds)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def count_frames(event, amount=1):
+    FRAME_EVENTS.labels(event).inc(amount)
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if len(values) == 0:
+        return {f"p{p}": None for p in points}
+    result = np.percentile(np.asarray(values), points)
+    return {f"p{p}": float(v) for p, v in zip(points, result)}
+
+
+def summary():
+    return {name: {"count": len(values), **percentiles(values)} for name, values in samples.items()}
+
+
+def reset_samples():
+    samples.clear()
+
+
+def exposition():
+    # With DETECTION_PROCESSES the workers write to PROMETHEUS_MULTIPROC_DIR and get merged here
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,11 +1,6 @@
 import os, random, cv2
-import supervision as sv
-import IPython
-import inference
-import ultralytics
+import numpy as np
 import time
-import requests
-import urllib.parse
 from dotenv import load_dotenv
 import socket
 import os
@@ -14,7 +9,10 @@ from datetime import datetime, date
 
 load_dotenv()
 
-from roboflow import Roboflow
+from detectorservice import DetectorService, load_detector_model
+from tally import ClassTally
+from decision import DecisionEngine
+import metrics
 # Check if dataset already exists
 
 def get_client_ip():
@@ -30,88 +28,107 @@ def get_client_ip():
     except Exception:
         return "127_0_0_1"  # Default to localhost if there's an error
 
-def detect_clothing(show_gui=False):
+def detect_clothing(show_gui=False, service=None, batch_size=None, camera_url=None):
     highestvaluekeytops=""
     highestvaluekeypants=""
     stop_condition=False
+    detecteditems = []
+    started = time.perf_counter()
 
+    # Without a warm service (e.g. running this file directly) build one for this call only
+    owns_service = service is None
+    if owns_service:
+        service = DetectorService()
+        service.model = service.load_model()
+        service.outbox.start()
 
-    project_id = "niceworkspace/clothing-detection-uhmgf"  # Replace with your actual project ID
-    dataset_version = "10" # Replace with your dataset version number
+    model = service.model
+    camera = service.camera(camera_url)
 
-    model_id = project_id.split("/")[1] + "/" + dataset_version
-    model = inference.get_model(model_id, os.getenv("ROBOFLOW_API_KEY"))
-
-    # Location of test set images
-    emad = cv2.VideoCapture(f'http://{os.getenv("CAMERA_STREAM_IP")}:{os.getenv("CAMERA_STREAM_PORT")}/stream')
-    
     # Check if camera opened successfully
-    if not emad.isOpened():
+    if not camera.connect():
         print("Error: Could not connect to camera stream")
+        if owns_service:
+            service.close()
         return []  # Return empty list if camera not available
 
-    width = 640
-    height = 360
-
-    currentWearsDB = {}
-
-    try:
-        client_ip = os.getenv("DEFAULT_CLIENT_IP")
-        url = f"http://{os.getenv("BACKEND_SERVER_IP")}:{os.getenv("BACKEND_SERVER_PORT")}/api/clothes/clothingcatalog"
-        response = requests.get(url, headers={"X-Forwarded-For": client_ip.replace("_", "."), "Content-Type": "application/json"}, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            print(data)
-        else:
-            print(f"Failed to fetch data from {url}")
-            data = []
-    except requests.exceptions.RequestException as e:
-        print(f"Error connecting to API: {e}")
-        data = []
-
-    try:
-        for clothing in data:
-            currentWearsDB[clothing["Name"]] = clothing["WearsBeforeWash"]
-    except (TypeError, KeyError) as e:
-        print(f"Error processing API data: {e}")
-        
-    print(currentWearsDB)
-    my_clothing = {
-        "Blue Hoodie": 0,
-        "HOSA Hoodie": 0,
-        "Waterloo Hoodie": 0,
-        "Yellow Hoodie": 0,
-        "Yellow T-Shirt": 0,
-        "Maroon T-Shirt": 0,
-        "Blue Sweatpants": 0,
-        "Gray Sweatpants": 0,
-        "White Sweatpants": 0,
-        "Navy Sweatpants": 0
-    }
-    last_time=time.time()
+    # Frames are decoded and resized to 640x360 on the grabber thread
+    grabber = service.grabber(camera_url)
+    # Only frames decoded after the trigger count, whatever is still buffered may be from before a drop
+    frame_seq = grabber.current_seq()
+    gate = service.gate(camera_url)
+    gate.reset()
+
+    # Collect this many frames and infer them in one call
+    if batch_size is None:
+        batch_size = int(os.getenv("DETECTOR_BATCH_SIZE", "1"))
+    batch = np.empty((batch_size, grabber.height, grabber.width, 3), dtype=np.uint8)
+
+    my_clothing = ClassTally()
+    frames_seen = 0
+    # Stops as soon as a top and a bottom are confidently seen, DETECTION_MAX_SECONDS at the latest
+    decision = DecisionEngine(
+        my_clothing.names,
+        service.catalog.types(),
+        max_seconds=float(os.getenv("DETECTION_MAX_SECONDS", "5")),
+    )
     while True:
-        # Read a frame from the camera
-        ret, frame = emad.read()
+        # Always take the newest frames so inference never falls behind the stream
+        collected = 0
+        while collected < batch_size:
+            frame_seq, frame = grabber.latest(after_seq=frame_seq)
+            if frame is None:
+                break
+            # The grabber reuses its buffers, so copy into the batch before asking for the next one
+            np.copyto(batch[collected], frame)
+            collected += 1
         
         # Check if frame was successfully read
-        if not ret or frame is None:
+        if collected == 0:
             print("Error: Could not read frame from camera")
             break  # Exit the loop if we can't get frames
-            
-        # Now we can safely resize the frame
-        frame = cv2.resize(frame, (width, height))
 
-        results = model.infer(frame, confidence=0.80, overlap=30)[0]
-        detections = sv.Detections.from_inference(results)
-        for prediction in results.predictions:
-            print(f"Detected: {prediction.class_name}")
-            try:
-                my_clothing[prediction.class_name] += 1
-            except KeyError:
-                pass
+        # Only frames that changed enough get inferred, optionally cropped to where clothes were last seen
+        infer_indices, inputs, offsets = [], [], []
+        for i in range(collected):
+            # Skipped frames aren't evidence for the decision, so until it has min_frames inferred ones
+            # gating would only make the trigger wait for more camera frames. Past that, a frame too
+            # similar to the last inferred one can't change the decision and is safe to skip.
+            warming_up = decision.frames + len(infer_indices) < decision.min_frames
+            if gate.should_infer(batch[i], force=warming_up):
+                model_input, offset = gate.crop(batch[i])
+                infer_indices.append(i)
+                inputs.append(model_input)
+                offsets.append(offset)
+        inferred = []
+        if inputs:
+            with metrics.stage("infer"):
+                inferred = model.infer(inputs, confidence=0.80, overlap=30)
+        metrics.count_frames("inferred", len(inputs))
+        metrics.count_frames("skipped", collected - len(inputs))
+
+        # Skipped frames count the most recent detections again in the tally, but only
+        # frames that were actually inferred are evidence for the decision
+        results, fresh = [], []
+        next_inferred = 0
+        for i in range(collected):
+            if next_inferred < len(infer_indices) and infer_indices[next_inferred] == i:
+                gate.remember(inferred[next_inferred], offsets[next_inferred])
+                fresh.append(gate.last_result)
+                next_inferred += 1
+            results.append(gate.last_result)
+        frames = list(batch[:collected])
+        with metrics.stage("tally"):
+            my_clothing.add_results(results)
+            decision.update(fresh)
+        frames_seen += collected
 
         # Only show GUI if requested
         if show_gui:
+            # Only the GUI needs supervision, so DETECTOR_BACKEND=onnx runs without the Roboflow stack
+            import supervision as sv
+            frame = frames[-1]
+            detections = sv.Detections.from_inference(results[-1])
             # Annotate boxes and labels
             box_annotator = sv.BoxAnnotator()
             label_annotator = sv.LabelAnnotator()
@@ -119,69 +136,23 @@ def detect_clothing(show_gui=False):
             annotated_image = label_annotator.annotate(scene=annotated_image, detections=detections)
             cv2.imshow('myWindow', annotated_image)
             
-        currenttime=time.time()
-        if currenttime-last_time>5:
-            # Find the top with the highest count using max() with a key function
-            
-            detecteditems = [clothing for clothing in my_clothing.keys() if my_clothing[clothing] > 10]
+        if decision.done():
+            # The tally counts skipped frames with the detections they reused, decision.frames only inferred ones
+            print(f"Detected over {frames_seen} frames ({decision.frames} inferred): {my_clothing.as_dict()}")
+            print(f"Decision: {decision.summary()}")
+            detecteditems = decision.decision()
             
             if len(detecteditems) > 0:
-                # Use the machine's IP address instead of device ID
-                client_ip = os.getenv("DEFAULT_CLIENT_IP")
-                print(f"Using client IP: {client_ip}")
-                itemstoAdd = []
-                today = date.today()
                 for item in detecteditems:
                     print(f"You are wearing: {item}")
-                    try:
-                        encoded_clothing = urllib.parse.quote(item)
-                        send_data = requests.put(
-                            f'http://{os.getenv("BACKEND_SERVER_IP")}:{os.getenv("BACKEND_SERVER_PORT")}/api/clothes/{encoded_clothing}', 
-                            json={"wearsBeforeWash": currentWearsDB.get(item, 0) + 1}, 
-                            headers={"X-Forwarded-For": client_ip.replace("_", "."), "Content-Type": "application/json"},
-                            timeout=5
-                        )
-                        
-                        # Try to get JSON response regardless of status code
-                        try:
-                            response_json = send_data.json()
-                            print(f"Response JSON: {response_json}")
-                        except ValueError:
-                            # If response isn't JSON, get the text content
-                            print(f"Response content: {send_data.text}")
-                
-                        # Also print the status code for reference
-                        print(f"Status code: {send_data.status_code}")
-                    except requests.exceptions.RequestException as e:
-                        print(f"Error updating API: {e}")
-
-                    itemstoAdd.append(item)
-
-                try:
-                    send_data = requests.post(
-                        f'http://{os.getenv("BACKEND_SERVER_IP")}:{os.getenv("BACKEND_SERVER_PORT")}/api/clothes', 
-                        json={"date": today.isoformat(), "items": itemstoAdd}, 
-                        headers={"X-Forwarded-For": client_ip.replace("_", "."), "Content-Type": "application/json"},
-                        timeout=5
-                    )
-                    print(f"Response JSON: {send_data.json()}")
-                except requests.exceptions.RequestException as e:
-                    print(f"Error updating API: {e}")
-                            
+                # One outbox entry per detection result, delivered in the background over the pooled session.
+                # Only which items were worn is queued, the new counts are worked out at delivery.
+                service.outbox.enqueue({
+                    "date": date.today().isoformat(),
+                    "items": detecteditems,
+                    "pending_wears": detecteditems,
+                })
     
-            my_clothing = {
-                "Blue Hoodie": 0,
-                "HOSA Hoodie": 0,
-                "Waterloo Hoodie": 0,
-                "Yellow Hoodie": 0,
-                "Yellow T-Shirt": 0,
-                "Maroon T-Shirt": 0,
-                "Blue Sweatpants": 0,
-                "Gray Sweatpants": 0,
-                "White Sweatpants": 0,
-                "Navy Sweatpants": 0
-            }
-            last_time=currenttime
             stop_condition=True
             
         if show_gui and (cv2.waitKey(1) & 0xFF == ord('q')):
@@ -189,8 +160,15 @@ def detect_clothing(show_gui=False):
         if stop_condition:
             break
             
-    # Clean up
-    emad.release()
+    # Clean up, keeping the camera open when it belongs to a long-lived service
+    print(f"Frame stats: {grabber.stats()}")
+    print(f"Gating stats: {gate.stats()}")
+    grabber.release()
+    metrics.observe("trigger", time.perf_counter() - started)
+    if owns_service:
+        # Give the write-back one chance to go out before the service goes away, the outbox keeps it otherwise
+        service.outbox.flush()
+        service.close()
     if show_gui:
         cv2.destroyAllWindows()
         
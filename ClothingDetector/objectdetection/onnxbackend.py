@@ -0,0 +1,211 @@
+import os
+import ast
+import argparse
+import cv2
+import numpy as np
+import yaml
+import onnxruntime as ort
+from tally import DETECTOR_DIR, load_class_names
+
+RUNS_DIR = os.path.join(DETECTOR_DIR, "runs", "detect")
+
+
+def run_imgsz(run_name):
+    with open(os.path.join(RUNS_DIR, run_name, "args.yaml")) as f:
+        return int(yaml.safe_load(f).get("imgsz", 320))
+
+
+def onnx_path(run_name, quantized=False):
+    weights_dir = os.path.join(RUNS_DIR, run_name, "weights")
+    return os.path.join(weights_dir, "best.int8.onnx" if quantized else "best.onnx")
+
+
+def export_run(run_name, quantize=False):
+    # Export runs/detect/<run>/weights/best.pt to ONNX at the size it was trained with
+    from ultralytics import YOLO
+
+    weights = os.path.join(RUNS_DIR, run_name, "weights", "best.pt")
+    imgsz = run_imgsz(run_name)
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    print(f"Exported {weights} to {exported}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantized = onnx_path(run_name, quantized=True)
+        quantize_dynamic(exported, quantized, weight_type=QuantType.QInt8)
+        print(f"Wrote int8 dynamic-quantized model to {quantized}")
+        return quantized
+    return exported
+
+
+def model_imgsz(session):
+    # Exported with dynamic=True the input dims are symbolic, ultralytics records imgsz in the metadata instead
+    size = session.get_inputs()[0].shape[2]
+    if isinstance(size, int):
+        return size
+    imgsz = session.get_modelmeta().custom_metadata_map.get("imgsz")
+    if imgsz is None:
+        return None
+    imgsz = ast.literal_eval(imgsz)
+    return int(max(imgsz)) if isinstance(imgsz, (list, tuple)) else int(imgsz)
+
+
+def letterbox(image, imgsz, out=None):
+    # Resize keeping the aspect ratio and pad to imgsz x imgsz, the way ultralytics does
+    height, width = image.shape[:2]
+    scale = min(imgsz / width, imgsz / height)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    pad_x, pad_y = (imgsz - new_width) // 2, (imgsz - new_height) // 2
+    if out is None:
+        out = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+    out[:] = 114
+    out[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(image, (new_width, new_height))
+    return out, scale, pad_x, pad_y
+
+
+def nms(boxes, scores, iou_threshold):
+    # Greedy non-maximum suppression on xyxy boxes, returns kept indices by descending score
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        intersection = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = intersection / (areas[i] + areas[order[1:]] - intersection + 1e-9)
+        order = order[1:][iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class OnnxPrediction:
+    # Same fields detect_clothing() and supervision read off a Roboflow prediction (x, y are box centres)
+    def __init__(self, x, y, width, height, confidence, class_id, class_name):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.confidence = confidence
+        self.class_id = class_id
+        self.class_name = class_name
+
+    def dict(self):
+        return {
+            "x": self.x, "y": self.y, "width": self.width, "height": self.height,
+            "confidence": self.confidence, "class_id": self.class_id, "class": self.class_name,
+        }
+
+
+class OnnxInferenceResult:
+    def __init__(self, predictions, image_width, image_height):
+        self.predictions = predictions
+        self.image_width = image_width
+        self.image_height = image_height
+
+    def dict(self, **kwargs):
+        # sv.Detections.from_inference() calls .dict() on Roboflow responses
+        return {
+            "image": {"width": self.image_width, "height": self.image_height},
+            "predictions": [prediction.dict() for prediction in self.predictions],
+        }
+
+
+class OnnxModel:
+    # Serves an exported YOLO run with onnxruntime on CPU behind the same infer() call as inference.get_model()
+    def __init__(self, path, names=None, imgsz=None, intra_op_threads=0, inter_op_threads=0):
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # The size the model was exported at, imgsz only when the model doesn't say
+        self.imgsz = model_imgsz(self.session) or imgsz
+        if self.imgsz is None:
+            raise ValueError(f"{path} has no fixed input size or imgsz metadata, pass imgsz")
+        self.names = names or load_class_names()
+        self.path = path
+
+    def preprocess(self, images):
+        batch = np.empty((len(images), 3, self.imgsz, self.imgsz), dtype=np.float32)
+        letterboxes = []
+        for i, image in enumerate(images):
+            padded, scale, pad_x, pad_y = letterbox(image, self.imgsz)
+            # BGR HWC uint8 -> RGB CHW float in [0, 1]
+            batch[i] = padded[:, :, ::-1].transpose(2, 0, 1)
+            letterboxes.append((scale, pad_x, pad_y, image.shape[1], image.shape[0]))
+        batch *= 1.0 / 255.0
+        return batch, letterboxes
+
+    def postprocess(self, output, letterbox_info, confidence, iou_threshold):
+        scale, pad_x, pad_y, image_width, image_height = letterbox_info
+        # YOLO head output is (4 + nc, anchors) with cx, cy, w, h in letterboxed pixels
+        output = output.T
+        class_scores = output[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        mask = scores >= confidence
+        boxes, scores, class_ids = output[mask, :4], scores[mask], class_ids[mask]
+
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / scale
+        xyxy[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / scale
+        xyxy[:, 2] = (boxes[:, 0] + boxes[:, 2] / 2 - pad_x) / scale
+        xyxy[:, 3] = (boxes[:, 1] + boxes[:, 3] / 2 - pad_y) / scale
+        xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, image_width)
+        xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, image_height)
+
+        # Class-aware NMS, like the Roboflow backend: offset boxes per class so classes never overlap
+        offsets = class_ids[:, None].astype(np.float32) * (max(image_width, image_height) + 1)
+        keep = nms(xyxy + offsets, scores, iou_threshold)
+
+        predictions = []
+        for i in keep:
+            x1, y1, x2, y2 = xyxy[i]
+            class_id = int(class_ids[i])
+            predictions.append(OnnxPrediction(
+                x=float((x1 + x2) / 2), y=float((y1 + y2) / 2),
+                width=float(x2 - x1), height=float(y2 - y1),
+                confidence=float(scores[i]), class_id=class_id, class_name=self.names[class_id],
+            ))
+        return OnnxInferenceResult(predictions, image_width, image_height)
+
+    def infer(self, image, confidence=0.5, overlap=50):
+        # overlap is a percentage, matching inference.get_model(...).infer()
+        images = image if isinstance(image, list) else [image]
+        batch, letterboxes = self.preprocess(images)
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [
+            self.postprocess(outputs[i], letterboxes[i], confidence, overlap / 100)
+            for i in range(len(images))
+        ]
+
+
+def load_onnx_model():
+    run = os.getenv("ONNX_RUN", "train9")
+    path = os.getenv("ONNX_MODEL_PATH") or onnx_path(run, quantized=os.getenv("ONNX_QUANTIZED", "false").lower() == "true")
+    # Fallback for models whose metadata didn't survive quantization
+    imgsz = None
+    if not os.getenv("ONNX_MODEL_PATH") and os.path.exists(os.path.join(RUNS_DIR, run, "args.yaml")):
+        imgsz = run_imgsz(run)
+    return OnnxModel(
+        path,
+        imgsz=imgsz,
+        intra_op_threads=int(os.getenv("ONNX_INTRA_OP_THREADS", "0")),
+        inter_op_threads=int(os.getenv("ONNX_INTER_OP_THREADS", "0")),
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export a runs/detect training run to ONNX")
+    parser.add_argument("--run", default="train9")
+    parser.add_argument("--quantize", action="store_true", help="Also write an int8 dynamic-quantized model")
+    args = parser.parse_args()
+    export_run(args.run, quantize=args.quantize)
@@ -0,0 +1,88 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import cv2
+import numpy as np
+from detectorservice import load_roboflow_model
+from onnxbackend import DETECTOR_DIR, OnnxModel, onnx_path
+
+TEST_IMAGES = os.path.join(DETECTOR_DIR, "datasets", "Clothing-Detection-10", "test", "images")
+
+
+def box_iou(a, b):
+    # a, b are predictions with centre x, y and width, height
+    ax1, ay1, ax2, ay2 = a.x - a.width / 2, a.y - a.height / 2, a.x + a.width / 2, a.y + a.height / 2
+    bx1, by1, bx2, by2 = b.x - b.width / 2, b.y - b.height / 2, b.x + b.width / 2, b.y + b.height / 2
+    inter = max(0, min(ax2, bx2) - max(ax1, bx1)) * max(0, min(ay2, by2) - max(ay1, by1))
+    union = a.width * a.height + b.width * b.height - inter
+    return inter / union if union > 0 else 0.0
+
+
+def matched_boxes(reference, candidate, iou_threshold=0.5):
+    matched = 0
+    used = set()
+    for ref in reference:
+        for i, cand in enumerate(candidate):
+            if i not in used and cand.class_name == ref.class_name and box_iou(ref, cand) >= iou_threshold:
+                used.add(i)
+                matched += 1
+                break
+    return matched
+
+
+def run_parity(candidate, images_dir=TEST_IMAGES, confidence=0.80, overlap=30):
+    reference = load_roboflow_model()
+    paths = sorted(glob.glob(os.path.join(images_dir, "*.jpg")))
+    same_classes = 0
+    ref_boxes = cand_boxes = matched = 0
+    ref_times, cand_times = [], []
+
+    for path in paths:
+        # Same input detect_clothing() feeds the model
+        frame = cv2.resize(cv2.imread(path), (640, 360))
+
+        start = time.perf_counter()
+        ref = reference.infer(frame, confidence=confidence, overlap=overlap)[0].predictions
+        ref_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        cand = candidate.infer(frame, confidence=confidence, overlap=overlap)[0].predictions
+        cand_times.append(time.perf_counter() - start)
+
+        # By id: Roboflow's hosted class names differ in case from data.yaml ("HOSA hoodie")
+        ref_classes = {p.class_id for p in ref}
+        cand_classes = {p.class_id for p in cand}
+        if ref_classes == cand_classes:
+            same_classes += 1
+        else:
+            print(f"{os.path.basename(path)}: roboflow={sorted(candidate.names[i] for i in ref_classes)} "
+                  f"onnx={sorted(candidate.names[i] for i in cand_classes)}")
+        ref_boxes += len(ref)
+        cand_boxes += len(cand)
+        matched += matched_boxes(ref, cand)
+
+    print(f"Images: {len(paths)}")
+    print(f"Same class set: {same_classes}/{len(paths)}")
+    print(f"Boxes matched at IoU>=0.5: {matched}/{ref_boxes} roboflow, {cand_boxes} onnx")
+    print(f"Median latency: roboflow {np.median(ref_times) * 1000:.1f} ms, onnx {np.median(cand_times) * 1000:.1f} ms")
+    return same_classes == len(paths)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the ONNX backend against the Roboflow backend on the test split")
+    parser.add_argument("--run", default="train9")
+    parser.add_argument("--quantized", action="store_true")
+    parser.add_argument("--model", help="Path to an .onnx file, overrides --run")
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=0)
+    parser.add_argument("--images", default=TEST_IMAGES)
+    args = parser.parse_args()
+
+    candidate = OnnxModel(
+        args.model or onnx_path(args.run, quantized=args.quantized),
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+    )
+    sys.exit(0 if run_parity(candidate, images_dir=args.images) else 1)
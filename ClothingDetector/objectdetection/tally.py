@@ -0,0 +1,38 @@
+import os
+import numpy as np
+import yaml
+
+DETECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_YAML = os.path.join(DETECTOR_DIR, "datasets", "Clothing-Detection-10", "data.yaml")
+
+
+def load_class_names(data_yaml=DATA_YAML):
+    with open(data_yaml) as f:
+        return yaml.safe_load(f)["names"]
+
+
+def prediction_class_ids(results):
+    # Flatten the class ids of every prediction in a batch of inference results
+    return np.fromiter((p.class_id for result in results for p in result.predictions), dtype=np.int64)
+
+
+class ClassTally:
+    # Per-class hit counts indexed by the data.yaml class ids
+    def __init__(self, names=None):
+        self.names = list(names or load_class_names())
+        self.counts = np.zeros(len(self.names), dtype=np.int64)
+
+    def add(self, class_ids):
+        class_ids = np.asarray(class_ids, dtype=np.int64)
+        # Ignore ids the dataset doesn't know about instead of failing the whole batch
+        class_ids = class_ids[(class_ids >= 0) & (class_ids < len(self.names))]
+        self.counts += np.bincount(class_ids, minlength=len(self.names))
+
+    def add_results(self, results):
+        self.add(prediction_class_ids(results))
+
+    def as_dict(self):
+        return dict(zip(self.names, self.counts.tolist()))
+
+    def reset(self):
+        self.counts[:] = 0
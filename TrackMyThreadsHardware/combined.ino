@@ -203,10 +203,16 @@ void loop() {
         delay(3000);
 
         HTTPClient http;
-        http.begin("http://10.0.0.116:5000/trigger-detection");
+        http.begin("http://10.0.0.116:5000/trigger-detection?wait=30");
         http.addHeader("Content-Type", "application/json");
         
+        // The server answers 503 while its model is still warming up, wait for it instead of dropping the scan
         int httpResponseCode = http.POST("");
+        for (int attempt = 0; httpResponseCode == 503 && attempt < 15; attempt++) {
+          Serial.println("Detector is warming up, retrying");
+          delay(2000);
+          httpResponseCode = http.POST("");
+        }
         if (httpResponseCode>0){
           String response=http.getString();
           Serial.println("Response: " + response);
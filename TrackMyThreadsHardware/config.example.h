@@ -7,7 +7,7 @@ const char* ssid = "YOUR_WIFI_SSID";
 const char* password = "YOUR_WIFI_PASSWORD";
 
 // Server URLs
-const char* serverUrl = "http://YOUR_SERVER_IP:5000/trigger-detection";
+const char* serverUrl = "http://YOUR_SERVER_IP:5000/trigger-detection?wait=30";
 const char* laundryUrl = "http://YOUR_SERVER_IP:5000/laundry-list";
 
 #endif
\ No newline at end of file